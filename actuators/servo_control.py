@@ -1,6 +1,7 @@
 # actuators/servo_control.py
 
 import pigpio
+import threading
 import time
 from utils.logger import get_logger
 
@@ -18,6 +19,8 @@ class ServoController:
         self.pin = pin
         self.move_delay = move_delay
         self.pi = pigpio.pi()
+        self._sequence_lock = threading.Lock()  # Serializes open/close sequences
+        self._sequence_thread = None
 
         if not self.pi.connected:
             raise RuntimeError("pigpio daemon is not running. Please start with 'sudo pigpiod'.")
@@ -43,10 +46,34 @@ class ServoController:
             logger.error(f"Failed to move servo to {angle}°: {e}")
             raise
 
+    def open_then_close_after(self, open_angle: float = 180, close_angle: float = 0, hold_seconds: float = 2.0):
+        """
+        Moves to open_angle, holds for hold_seconds, then moves to close_angle.
+        Runs on a background thread so the caller returns immediately.
+        """
+        self._sequence_thread = threading.Thread(
+            target=self._open_hold_close,
+            args=(open_angle, close_angle, hold_seconds),
+            name="ServoSequence",
+            daemon=True
+        )
+        self._sequence_thread.start()
+
+    def _open_hold_close(self, open_angle: float, close_angle: float, hold_seconds: float):
+        with self._sequence_lock:
+            try:
+                self.set_angle(open_angle)
+                time.sleep(hold_seconds)
+                self.set_angle(close_angle)
+            except Exception as e:
+                logger.error(f"Servo open/close sequence failed: {e}")
+
     def cleanup(self):
         """
         Stops servo signal and releases GPIO pin.
         """
+        if self._sequence_thread is not None:
+            self._sequence_thread.join(timeout=5.0)
         try:
             self.pi.set_servo_pulsewidth(self.pin, 0)
             self.pi.stop()
@@ -7,7 +7,7 @@ import glob
 import random
 
 def send_image(broker_ip="192.168.166.195", topic="camera/image", calib_path="camera/calibration_result.npz",
-               test_img_dir="camera/img", use_test_image=False):
+               test_img_dir="camera/img", use_test_image=False, publish=None):
     """
     Send an image via MQTT, either from camera or test image.
     
@@ -17,6 +17,9 @@ def send_image(broker_ip="192.168.166.195", topic="camera/image", calib_path="ca
         calib_path: Path to camera calibration data
         test_img_dir: Directory containing test images
         use_test_image: If True, use random test image; if False, use camera
+        publish: Optional callable(topic, payload) that takes over publishing, e.g. to hand
+            the payload to the thread that owns a shared client; if None, a temporary
+            connection to broker_ip is opened and closed for this image
     """
     # Load calibration data
     try:
@@ -106,17 +109,20 @@ def send_image(broker_ip="192.168.166.195", topic="camera/image", calib_path="ca
     try:
         # Encode the processed image
         _, buffer = cv2.imencode('.jpg', resized_frame)
-        jpg_as_text = base64.b64encode(buffer).decode()
+        jpg_as_text = base64.b64encode(buffer)  # Already bytes, published without re-encoding
         
-        # Establish MQTT connection
-        client = mqtt.Client()
-        client.connect(broker_ip, 1883, 60)
-        
-        # Publish message
-        result = client.publish(topic, jpg_as_text)
-        client.disconnect()
+        if publish is None:
+            # Establish a one-off MQTT connection
+            temp_client = mqtt.Client()
+            temp_client.connect(broker_ip, 1883, 60)
+            rc = temp_client.publish(topic, jpg_as_text).rc
+            temp_client.disconnect()
+        else:
+            # The caller publishes it; a paho client is not safe to drive from two threads
+            publish(topic, jpg_as_text)
+            rc = mqtt.MQTT_ERR_SUCCESS
         
-        if result.rc == mqtt.MQTT_ERR_SUCCESS:
+        if rc == mqtt.MQTT_ERR_SUCCESS:
             if use_test_image and test_img_path:
                 print(f"Test image {test_img_path} sent successfully (with calibration applied).")
                 
@@ -130,7 +136,7 @@ def send_image(broker_ip="192.168.166.195", topic="camera/image", calib_path="ca
                 print("Camera image sent successfully (with calibration applied).")
             return True
         else:
-            print(f"Failed to publish MQTT message. Error code: {result.rc}")
+            print(f"Failed to publish MQTT message. Error code: {rc}")
             return False
             
     except Exception as e:
@@ -1,12 +1,18 @@
+import os
 import pigpio
+import selectors
+import socket
+import subprocess
+import sys
 import threading
 import time
-from queue import Queue, Empty
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 
-from sensors.rfid_reader import RFIDReader
 from actuators.servo_control import ServoController
 from utils import gpio_pins
+from utils.scheduler import PeriodicTasks
+from utils.worker_pool import PrewarmedPool
+from utils.logger import get_logger
 from sensors.pir_sensor import setup_pir_sensor
 from sensors.ultrasonic_sensor import UltrasonicSensor
 from sensors.magnetic_door_sensor import MagneticSensor
@@ -15,6 +21,8 @@ from camera.mqtt_pub import send_image
 
 import paho.mqtt.client as mqtt
 
+log = get_logger(__name__)
+
 PIR_PIN = gpio_pins.PIR_SENSOR_PIN
 MAGNETIC_PIN = gpio_pins.MAGNETIC_DOOR_SENSOR_PIN
 
@@ -30,399 +38,756 @@ magnetic_sensor = MagneticSensor(pi=pi, pin=MAGNETIC_PIN)
 # Globals and synchronization primitives
 door_open_alarm_triggered = False
 authorized_door_open = False
-shutdown_event = threading.Event()
-rfid_queue = Queue()
+door_state = 1  # 1 = closed, 0 = open; written by door_edge_callback (a single int store)
+# Decoded (authorized, uid) messages from the RFID reader process; uid is None for a card removal
+rfid_deque = deque()
+_rfid_buf = bytearray()  # Partial line read from the reader pipe
+
+# --- RFID card-removal state machine (replaces blocking wait after an authorized open) ---
+RFID_IDLE = 0
+RFID_WAITING_CARD_REMOVAL = 1
+CARD_REMOVAL_TIMEOUT_NS = 10_000_000_000
+rfid_state = RFID_IDLE
+card_removal_uid = None
+card_removal_deadline_ns = 0
+
+# --- Event notification: the main loop blocks in a selector on the MQTT socket, the RFID pipe
+# and a wakeup socket that threads (e.g. pigpio callbacks) write to via notify_event() ---
+pending_lock = threading.Lock()
+pending_events = set()
+_wake_r, _wake_w = socket.socketpair()
+_wake_r.setblocking(False)
+_wake_w.setblocking(False)
 
 # --- IMPROVED: Better motion tracking with thread safety ---
 motion_lock = threading.Lock()
-last_motion_time = 0
+last_motion_ns = 0  # time.monotonic_ns() of the last PIR edge; written only by the main loop
+motion_until_ns = 0  # end of the recent-motion window; written only by the main loop
+last_motion_tick = 0  # pigpio tick (µs) of the last PIR edge
 motion_count = 0  # Debug counter
 pir_callback_active = True
 
 # --- Track time of last authorized door open and allowed open interval
-last_authorized_open_time = 0
-last_face_recognition_success = 0
-AUTHORIZED_DOOR_OPEN_INTERVAL = 5  # seconds, adjust as needed
-FACE_RECOGNITION_COOLDOWN = 10  # seconds after successful face recognition
+# All timestamps are time.monotonic_ns() values; intervals are integer nanoseconds.
+# Deadlines are computed once when an event fires, so checks are a single compare per tick.
+NS_PER_S = 1_000_000_000
+authorized_until_ns = 0  # door may be open legally until this time
+face_recognition_cooldown_until_ns = 0  # no new face recognition before this time
+AUTHORIZED_DOOR_OPEN_INTERVAL_NS = 5 * NS_PER_S  # adjust as needed
+FACE_RECOGNITION_COOLDOWN_NS = 10 * NS_PER_S  # after successful face recognition
 
 # --- Face recognition state tracking ---
-face_result_queue = Queue()
-face_recognition_pending = False
-face_recognition_start_time = 0
-FACE_RECOGNITION_TIMEOUT = 5  # seconds
+FACE_RECOGNITION_TIMEOUT_NS = 5 * NS_PER_S
+
+class FaceState:
+    """
+    Face recognition state, owned by main() and passed to the helpers that use it.
 
-# --- Thread pool for async image operations ---
-image_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ImageWorker")
-active_image_futures = set()  # Track active image capture tasks
+    Attributes:
+        pending (bool): An image was sent and no result or timeout has been handled yet.
+        timeout_ns (int): monotonic_ns() deadline for the pending recognition's result.
+        results (deque): Raw MQTT result payloads (bytes), appended by on_face_result.
+    """
+    __slots__ = ("pending", "timeout_ns", "results")
+
+    def __init__(self):
+        self.pending = False
+        self.timeout_ns = 0
+        self.results = deque()
+
+# --- Main loop timing ---
+STATUS_INTERVAL_NS = 30 * NS_PER_S  # between status prints
+MOTION_WINDOW_NS = 5 * NS_PER_S  # how long a PIR trigger counts as recent motion
+MOTION_RECHECK_INTERVAL_NS = 250_000_000  # between distance checks while motion is recent
+RFID_CPU = 3  # core the RFID reader process is pinned to
+RFID_RESTART_MIN_NS = 1 * NS_PER_S  # first reader restart delay, doubled per quick exit
+RFID_RESTART_MAX_NS = 60 * NS_PER_S
+DOOR_CHECK_INTERVAL_NS = 1 * NS_PER_S  # heartbeat re-check of the door state between edges
+PIR_WATCHDOG_INTERVAL_NS = 30 * NS_PER_S  # without a PIR callback before checking the sensor
+IMAGE_COOLDOWN_NS = 3 * NS_PER_S  # between image attempts
+MQTT_MISC_INTERVAL_NS = 1 * NS_PER_S  # between MQTT keepalive/reconnect checks
+MQTT_RECONNECT_MIN_NS = 1 * NS_PER_S  # first reconnect backoff, doubled per failure
+MQTT_RECONNECT_MAX_NS = 60 * NS_PER_S
+# A get_distance() call costs ~0.3 s (echo wait plus its settle sleep), so it runs on the
+# image worker and the result comes back through notify_event("distance")
+ULTRASONIC_MIN_INTERVAL_NS = 500_000_000  # between HC-SR04 read starts
+ultrasonic_ready_ns = 0  # next HC-SR04 read allowed at this time
+ultrasonic_in_flight = False  # a read is queued or running on the image worker
+ultrasonic_results = deque()  # distances (cm or None) from finished reads
+
+# --- One MQTT client for the whole app: face results in, images out ---
+mqtt_client = mqtt.Client()
+
+# --- MQTT connection state. reconnect() blocks (connect timeout), so it runs on a helper
+# thread; the main loop leaves the client alone while mqtt_reconnecting is set ---
+mqtt_link_lost = False  # socket error seen; reconnect even if paho still holds a socket
+mqtt_reconnecting = threading.Event()
+mqtt_reconnect_ok = False  # result of the last reconnect attempt
+mqtt_reconnect_backoff_ns = MQTT_RECONNECT_MIN_NS
+mqtt_next_reconnect_ns = 0
+
+# --- Pre-started worker for async image operations (no thread spawn on the capture path) ---
+image_executor = PrewarmedPool(max_workers=1, thread_name_prefix="ImageWorker")
+# Encoded (topic, payload) images from the worker; only the main loop touches mqtt_client
+outgoing_images = deque()
+image_count_lock = threading.Lock()
+active_image_count = 0  # In-flight image capture tasks, decremented by _on_image_done
+MAX_ACTIVE_IMAGES = 2
+
+def notify_event(source):
+    """Record an event from `source` and wake the main loop."""
+    with pending_lock:
+        wake = not pending_events
+        pending_events.add(source)
+    if wake:
+        try:
+            _wake_w.send(b'\0')
+        except BlockingIOError:
+            pass  # Wakeup already pending
 
 def on_face_result(client, userdata, msg):
-    result = msg.payload.decode()
-    print(f"[MQTT] Received face recognition result: {result}")
-    face_result_queue.put(result)
+    # Runs on the main thread from loop_read(); userdata is the FaceState.
+    # Keep the raw payload, it is only decoded when printed
+    userdata.results.append(msg.payload)
+
+def start_face_result_listener(client, face_state, broker_ip="192.168.166.195", topic="camera/result"):
+    """Connect the shared MQTT client for face results. Its socket is serviced by the main loop, not a paho thread."""
+    global mqtt_link_lost
 
-def start_face_result_listener(broker_ip="192.168.166.195", topic="camera/result"):
-    client = mqtt.Client()
+    client.user_data_set(face_state)
     client.on_message = on_face_result
-    client.connect(broker_ip, 1883, 60)
-    client.subscribe(topic)
-    client.loop_start()  # Run MQTT loop in background thread
+    client.on_connect = lambda c, userdata, flags, rc: c.subscribe(topic)  # Also resubscribes on reconnect
+    try:
+        client.connect(broker_ip, 1883, 60)
+    except OSError as e:
+        # Broker unreachable at startup: mqtt_housekeeping keeps retrying with backoff
+        log.warning("[MQTT] Connect failed: %s", e)
+        mqtt_link_lost = True
     return client
 
+def watch_mqtt_socket(sel, client):
+    """(Re-)register the MQTT client's current socket with the main loop selector."""
+    for key in list(sel.get_map().values()):
+        if key.data == "mqtt":
+            sel.unregister(key.fileobj)
+    sock = client.socket()
+    if sock is not None:
+        sel.register(sock, selectors.EVENT_READ, "mqtt")
+
+def mqtt_connection_lost(sel, e):
+    """Handle a socket error from paho: stop watching the socket and let housekeeping reconnect."""
+    global mqtt_link_lost
+
+    log.warning("[MQTT] Connection lost: %s", e)
+    mqtt_link_lost = True
+    for key in list(sel.get_map().values()):
+        if key.data == "mqtt":
+            sel.unregister(key.fileobj)
+
+def mqtt_usable():
+    """True when the main loop may drive the client's socket."""
+    return not mqtt_link_lost and not mqtt_reconnecting.is_set()
+
+def read_mqtt(sel, client):
+    """Read from the MQTT socket; dispatches on_face_result directly on this thread."""
+    try:
+        rc = client.loop_read()
+    except OSError as e:  # paho only catches ConnectionError itself
+        mqtt_connection_lost(sel, e)
+        return
+    if rc != mqtt.MQTT_ERR_SUCCESS:
+        watch_mqtt_socket(sel, client)
+
+def flush_mqtt(sel, client):
+    """Write queued MQTT packets; watch the socket for writability only while some remain."""
+    if not mqtt_usable():
+        return
+    try:
+        if client.want_write():
+            client.loop_write()
+    except OSError as e:
+        mqtt_connection_lost(sel, e)
+        return
+    sock = client.socket()
+    if sock is None:
+        return
+    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.want_write() else 0)
+    try:
+        if sel.get_key(sock).events != events:
+            sel.modify(sock, events, "mqtt")
+    except KeyError:
+        pass
+
+def _mqtt_reconnect_worker(client):
+    """Helper thread: run the blocking reconnect, then wake the main loop with the result."""
+    global mqtt_reconnect_ok
+
+    try:
+        client.reconnect()
+        mqtt_reconnect_ok = True
+    except Exception as e:
+        log.warning("[MQTT] Reconnect failed: %s", e)
+        mqtt_reconnect_ok = False
+    mqtt_reconnecting.clear()
+    notify_event("mqtt_reconnect")
+
+def on_mqtt_reconnect_done(sel, client, now_ns):
+    """Main loop side of a finished reconnect attempt: watch the new socket or back off further."""
+    global mqtt_link_lost, mqtt_reconnect_backoff_ns, mqtt_next_reconnect_ns
+
+    if mqtt_reconnect_ok:
+        log.info("[MQTT] Reconnected")
+        mqtt_link_lost = False
+        mqtt_reconnect_backoff_ns = MQTT_RECONNECT_MIN_NS
+        watch_mqtt_socket(sel, client)
+    else:
+        mqtt_next_reconnect_ns = now_ns + mqtt_reconnect_backoff_ns
+        mqtt_reconnect_backoff_ns = min(mqtt_reconnect_backoff_ns * 2, MQTT_RECONNECT_MAX_NS)
+
+def mqtt_housekeeping(sel, client, now_ns):
+    """Periodic task: MQTT keepalive, and start a background reconnect if the connection was lost."""
+    if mqtt_reconnecting.is_set():
+        return
+    if not mqtt_link_lost:
+        try:
+            if client.loop_misc() != mqtt.MQTT_ERR_NO_CONN:
+                return
+        except OSError as e:
+            mqtt_connection_lost(sel, e)
+    if now_ns < mqtt_next_reconnect_ns:
+        return
+
+    mqtt_reconnecting.set()
+    threading.Thread(target=_mqtt_reconnect_worker, args=(client,), name="MqttReconnect", daemon=True).start()
+
 def pir_motion_callback(gpio, level, tick):
-    """Called by pigpio when PIR sensor goes high."""
-    global last_motion_time, motion_count, pir_callback_active
-    
+    """
+    Called by pigpio when PIR sensor goes high.
+    Kept lean: bounces are filtered in the daemon, the edge is stamped with pigpio's
+    tick, and the main loop converts it to a motion time when it wakes.
+    """
+    global last_motion_tick, motion_count, pir_callback_active
+
     try:
         with motion_lock:
-            current_time = time.time()
-            last_motion_time = current_time
+            last_motion_tick = tick
             motion_count += 1
             pir_callback_active = True
-            print(f"[PIR] Motion detected! Count: {motion_count}, Time: {current_time:.2f}")
+        notify_event("motion")
     except Exception as e:
-        print(f"[PIR] Error in callback: {e}")
+        log.error("[PIR] Error in callback: %s", e)
 
-def pir_watchdog_thread(stop_event):
-    """Monitor PIR sensor health and re-initialize if needed."""
+def check_pir_health(now_ns):
+    """Periodic task: check that the PIR callback fired since the last run."""
     global pir_callback_active
-    last_check_time = time.time()
-    
-    while not stop_event.is_set():
-        current_time = time.time()
-        
-        # Check if PIR callback has been active in the last 30 seconds
-        if (current_time - last_check_time) > 30:
-            with motion_lock:
-                if not pir_callback_active:
-                    print("[PIR] Watchdog: PIR seems inactive, checking sensor...")
-                    # Read PIR sensor state directly
-                    pir_state = pi.read(PIR_PIN)
-                    print(f"[PIR] Direct read: {pir_state}")
-                
-                # Reset the active flag for next check
-                pir_callback_active = False
-                last_check_time = current_time
-        
-        time.sleep(5)
 
-def alarm_monitor_thread(stop_event):
+    with motion_lock:
+        if not pir_callback_active:
+            log.warning("[PIR] Watchdog: PIR seems inactive, checking sensor...")
+            # Read PIR sensor state directly
+            pir_state = pi.read(PIR_PIN)
+            log.warning("[PIR] Direct read: %s", pir_state)
+        else:
+            log.debug("[PIR] Motion count: %d, last edge tick: %d", motion_count, last_motion_tick)
+
+        # Reset the active flag for next check
+        pir_callback_active = False
+
+def door_edge_callback(gpio, level, tick):
+    """Called by pigpio when the magnetic door sensor changes state."""
+    global door_state
+
+    if level in (0, 1):  # 2 = watchdog timeout, no level change
+        door_state = level
+        notify_event("door")
+
+def check_door_state(now_ns):
+    """
+    Raise the alarm on unauthorized opens, using the state last reported by door_edge_callback.
+    Runs on every door edge and as a heartbeat periodic task.
+    """
     global door_open_alarm_triggered, authorized_door_open
-    global last_authorized_open_time
 
-    while not stop_event.is_set():
-        try:
-            door_state = magnetic_sensor.read()  # 1 = closed, 0 = open
-            current_time = time.time()
-
-            # If the door is open and NOT within the authorized open window, trigger the alarm
-            if door_state == 0:
-                # Check if the door was opened legally (recent authorized open)
-                if not authorized_door_open:
-                    # If not currently in authorized door open interval, trigger alarm
-                    if (current_time - last_authorized_open_time) > AUTHORIZED_DOOR_OPEN_INTERVAL:
-                        if not door_open_alarm_triggered:
-                            print("ALARM: Door opened WITHOUT authorization!")
-                            try:
-                                send_status_async("PHYSICAL_ALARM")
-                            except Exception as e:
-                                print(f"Failed to send PHYSICAL_ALARM status: {e}")
-                            door_open_alarm_triggered = True
-                else:
-                    # Door is open and authorized, do not trigger alarm
-                    pass
-            elif door_state == 1:
-                # Door closed: reset the flags
-                door_open_alarm_triggered = False
-                authorized_door_open = False
+    try:
+        # If the door is open and NOT within the authorized open window, trigger the alarm
+        if door_state == 0:
+            # Check if the door was opened legally (recent authorized open)
+            if not authorized_door_open:
+                # If not currently in authorized door open interval, trigger alarm
+                if now_ns >= authorized_until_ns:
+                    if not door_open_alarm_triggered:
+                        log.warning("ALARM: Door opened WITHOUT authorization!")
+                        try:
+                            send_status_async("PHYSICAL_ALARM")
+                        except Exception as e:
+                            log.error("Failed to send PHYSICAL_ALARM status: %s", e)
+                        door_open_alarm_triggered = True
+            else:
+                # Door is open and authorized, do not trigger alarm
+                pass
+        elif door_state == 1:
+            # Door closed: reset the flags
+            door_open_alarm_triggered = False
+            authorized_door_open = False
 
-        except Exception as e:
-            print(f"[ALARM] Error in alarm monitor: {e}")
+    except Exception as e:
+        log.error("[ALARM] Error in alarm monitor: %s", e)
 
-        # Sleep to avoid busy-waiting
-        time.sleep(0.1)
+def start_rfid_reader(authorized_uids):
+    """
+    Start the RFID reader process (serial decoding stays out of this interpreter).
+    Returns (Popen, read end of its message pipe).
 
-def rfid_reader_thread(reader: RFIDReader, queue: Queue, stop_event: threading.Event):
+    It is exec'd as a fresh interpreter rather than forked: this process already runs threads
+    (pigpio, image worker, log listener), and multiprocessing's spawn/forkserver would re-run
+    this module's top-level hardware setup as __mp_main__.
     """
-    Worker thread that continuously attempts to read an RFID card (with a short timeout).
-    Whenever a UID is read (authorized or not), it pushes (authorized, uid) into the queue.
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "sensors.rfid_reader", str(write_fd), "/dev/serial0", *authorized_uids],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            pass_fds=(write_fd,)
+        )
+    except Exception:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+    os.set_blocking(read_fd, False)
+    try:
+        os.sched_setaffinity(proc.pid, {RFID_CPU})
+    except (AttributeError, OSError) as e:
+        log.warning("[RFID] Could not pin reader process to CPU %d: %s", RFID_CPU, e)
+    return proc, read_fd
+
+def read_rfid_pipe(fd):
     """
-    while not stop_event.is_set():
-        try:
-            # Attempt to read a card, waiting at most 0.5 seconds each call
-            authorized, uid = reader.read_card()
-            if uid:
-                queue.put((authorized, uid))
-        except Exception as e:
-            print(f"[RFID] Error reading card: {e}")
-        # Loop again immediately (reader.read_card will block up to timeout)
+    Decode every complete line waiting on the RFID reader pipe into rfid_deque.
+    Returns False once the reader process has closed the pipe.
+    """
+    try:
+        data = os.read(fd, 4096)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    if not data:
+        return False
 
-def process_rfid_events(reader, servo):
+    _rfid_buf.extend(data)
+    *lines, rest = _rfid_buf.split(b'\n')
+    _rfid_buf[:] = rest
+    for msg in lines:
+        if msg == b'-':
+            rfid_deque.append((False, None))
+        elif msg:
+            rfid_deque.append((msg[:1] == b'A', msg[1:].decode('ascii')))
+    return True
+
+def process_rfid_events(servo, now_ns):
     """
-    Process RFID events from the rfid_queue.
+    Process one RFID event from the rfid_deque.
+    Returns True if an event was handled, False if the deque was empty.
     """
     global authorized_door_open, door_open_alarm_triggered
-    global last_authorized_open_time
+    global authorized_until_ns
+    global rfid_state, card_removal_uid, card_removal_deadline_ns
+
+    if rfid_state == RFID_WAITING_CARD_REMOVAL and now_ns >= card_removal_deadline_ns:
+        log.info("[RFID] Card removal wait timed out.")
+        rfid_state = RFID_IDLE
 
     try:
-        authorized, uid = rfid_queue.get_nowait()
-    except Empty:
-        return
+        authorized, uid = rfid_deque.popleft()
+    except IndexError:
+        return False
+
+    if rfid_state == RFID_WAITING_CARD_REMOVAL:
+        if not uid:
+            rfid_state = RFID_IDLE
+            return True
+        if uid == card_removal_uid:
+            return True  # Same card still on the reader
+        rfid_state = RFID_IDLE
 
     if uid:
-        print(f"Card UID: {uid} - {'AUTHORIZED' if authorized else 'UNAUTHORIZED'}")
+        log.info("Card UID: %s - %s", uid, "AUTHORIZED" if authorized else "UNAUTHORIZED")
 
         if authorized:
-            print("Access granted - Opening door.")
+            log.info("Access granted - Opening door.")
             try:
                 send_status_async("AUTHORIZED_CARD")
             except Exception as e:
-                print(f"Failed to send AUTHORIZED_CARD status: {e}")
+                log.error("Failed to send AUTHORIZED_CARD status: %s", e)
 
             authorized_door_open = True
-            last_authorized_open_time = time.time()  # Record time for legal open
-            servo.set_angle(180)
-            time.sleep(2)
-            servo.set_angle(0)
-            print("Please remove the card...")
-
-            # Wait until the card is removed
-            while True:
-                try:
-                    _, current_uid = reader.read_card()
-                    if not current_uid:
-                        break
-                except Exception as e:
-                    print(f"Error checking card removal: {e}")
-                    break
-                time.sleep(0.1)
+            authorized_until_ns = now_ns + AUTHORIZED_DOOR_OPEN_INTERVAL_NS  # Legal open window
+            servo.open_then_close_after(open_angle=180, close_angle=0, hold_seconds=2.0)
+            log.info("Please remove the card...")
+
+            # Ignore this card until the reader process reports it removed (or the wait times out)
+            rfid_state = RFID_WAITING_CARD_REMOVAL
+            card_removal_uid = uid
+            card_removal_deadline_ns = now_ns + CARD_REMOVAL_TIMEOUT_NS
 
         else:
-            print("Access denied!")
+            log.info("Access denied!")
             try:
                 send_status_async("UNAUTHORIZED_CARD")
             except Exception as e:
-                print(f"Failed to send UNAUTHORIZED_CARD status: {e}")
+                log.error("Failed to send UNAUTHORIZED_CARD status: %s", e)
 
-        # Small delay to avoid re-processing the same card
-        time.sleep(0.5)
+    return True
+
+def _read_distance():
+    """Runs on the image worker: one ultrasonic read, handed back to the main loop."""
+    try:
+        distance = ultrasonic_sensor.get_distance()
+    except Exception as e:
+        log.error("[IMAGE] Error reading ultrasonic: %s", e)
+        distance = None
+    ultrasonic_results.append(distance)
+    notify_event("distance")
+
+def check_motion_and_distance(now_ns, motion_until_ns):
+    """
+    Check if motion + distance conditions are met for image capture.
+    Starts a background distance read while motion is recent and evaluates it once it is back.
+    """
+    global ultrasonic_ready_ns, ultrasonic_in_flight
+
+    motion_recent = now_ns < motion_until_ns
+
+    if ultrasonic_results:
+        distance = ultrasonic_results.popleft()
+        ultrasonic_in_flight = False
+        if not motion_recent:
+            return False
+        if distance is not None and distance <= 50:
+            log.info("[IMAGE] Conditions met (distance=%.1f cm, motion in last 5s)", distance)
+            return True
+        elif distance:
+            log.debug("[IMAGE] Distance too far: %.1f cm", distance)
+        else:
+            log.debug("[IMAGE] Failed to read distance")
+
+    # The ultrasonic read is device-latency bound: at most one in flight, rate limited.
+    # (Callers only get here while no face recognition is pending.)
+    if motion_recent and not ultrasonic_in_flight and now_ns >= ultrasonic_ready_ns:
+        ultrasonic_ready_ns = now_ns + ULTRASONIC_MIN_INTERVAL_NS
+        ultrasonic_in_flight = True
+        image_executor.submit(_read_distance)
 
-def check_motion_and_distance():
-    """Check if motion + distance conditions are met for image capture."""
-    with motion_lock:
-        current_time = time.time()
-        motion_recent = (current_time - last_motion_time) <= 5
-        
-    if motion_recent:
-        try:
-            distance = ultrasonic_sensor.get_distance()
-            if distance is not None and distance <= 50:
-                print(f"[IMAGE] Conditions met (distance={distance:.1f} cm, motion in last 5s)")
-                return True
-            else:
-                print(f"[IMAGE] Distance too far: {distance} cm" if distance else "[IMAGE] Failed to read distance")
-        except Exception as e:
-            print(f"[IMAGE] Error reading ultrasonic: {e}")
-    
     return False
 
+def queue_image_publish(topic, payload):
+    """Runs on the image worker: hand an encoded image to the main loop for publishing."""
+    outgoing_images.append((topic, payload))
+    notify_event("image")
+
+def publish_queued_images(sel, client):
+    """Publish images queued by the worker. Images are dropped while the broker is unreachable."""
+    while outgoing_images:
+        topic, payload = outgoing_images.popleft()
+        if not mqtt_usable():
+            log.warning("[FACE] MQTT disconnected, dropping image")
+            continue
+        try:
+            rc = client.publish(topic, payload).rc
+        except OSError as e:
+            mqtt_connection_lost(sel, e)
+            continue
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            log.warning("[FACE] Image publish failed: rc=%s", rc)
+    flush_mqtt(sel, client)
+
 def async_send_image():
     """Async wrapper for send_image - runs in thread pool."""
     try:
-        print("[FACE] Starting async image capture...")
-        send_image(use_test_image=False)
-        print("[FACE] Image sent successfully")
+        log.debug("[FACE] Starting async image capture...")
+        if not send_image(use_test_image=False, publish=queue_image_publish):
+            return False
+        log.info("[FACE] Image queued for sending")
         return True
     except Exception as e:
-        print(f"[FACE] Failed to send image: {e}")
+        log.error("[FACE] Failed to send image: %s", e)
         return False
 
-def start_face_recognition():
+def _on_image_done(future):
+    """Done-callback for image capture futures: release the slot and report failures."""
+    global active_image_count
+
+    with image_count_lock:
+        active_image_count -= 1
+
+    exc = future.exception()
+    if exc is not None:
+        log.error("[FACE] Image capture exception: %s", exc)
+    elif not future.result():
+        log.warning("[FACE] Image capture failed")
+
+def start_face_recognition(face_state, now_ns):
     """Start face recognition process (completely non-blocking)."""
-    global face_recognition_pending, face_recognition_start_time, active_image_futures
-    
-    # Clean up any completed futures
-    active_image_futures = {f for f in active_image_futures if not f.done()}
+    global active_image_count
     
     # Limit concurrent image operations to prevent resource exhaustion
-    if len(active_image_futures) >= 2:
-        print("[FACE] Too many concurrent image operations, skipping...")
+    if active_image_count >= MAX_ACTIVE_IMAGES:
+        log.debug("[FACE] Too many concurrent image operations, skipping...")
         return False
     
     try:
         # Submit image capture to thread pool
-        future = image_executor.submit(async_send_image)
-        active_image_futures.add(future)
+        with image_count_lock:
+            active_image_count += 1
+        try:
+            future = image_executor.submit(async_send_image)
+        except Exception:
+            with image_count_lock:
+                active_image_count -= 1
+            raise
+        future.add_done_callback(_on_image_done)
         
-        face_recognition_pending = True
-        face_recognition_start_time = time.time()
-        print("[FACE] Image capture started asynchronously...")
+        face_state.results.clear()  # A late result from a timed-out attempt must not answer this one
+        face_state.pending = True
+        face_state.timeout_ns = now_ns + FACE_RECOGNITION_TIMEOUT_NS
+        log.info("[FACE] Image capture started asynchronously...")
         return True
     except Exception as e:
-        print(f"[FACE] Failed to start async image capture: {e}")
+        log.error("[FACE] Failed to start async image capture: %s", e)
         return False
 
-def check_face_recognition_result(servo):
-    """Check for face recognition result (non-blocking)."""
-    global face_recognition_pending, authorized_door_open, last_authorized_open_time, last_face_recognition_success, active_image_futures
-    
-    if not face_recognition_pending:
-        return False
-    
-    current_time = time.time()
-    
-    # Clean up any completed image futures
-    completed_futures = {f for f in active_image_futures if f.done()}
-    for future in completed_futures:
-        try:
-            result = future.result()  # Get result and handle any exceptions
-            if not result:
-                print("[FACE] Image capture failed")
-        except Exception as e:
-            print(f"[FACE] Image capture exception: {e}")
-    active_image_futures -= completed_futures
-    
+def check_face_recognition_result(servo, face_state, now_ns):
+    """
+    Check for face recognition result (non-blocking).
+    Only called while face_state.pending is set, so idle ticks skip the call entirely.
+    """
+    global authorized_door_open, authorized_until_ns, face_recognition_cooldown_until_ns
+
     # Check for timeout
-    if (current_time - face_recognition_start_time) > FACE_RECOGNITION_TIMEOUT:
-        print("[FACE] Face recognition timed out.")
-        face_recognition_pending = False
+    if now_ns >= face_state.timeout_ns:
+        log.info("[FACE] Face recognition timed out.")
+        face_state.pending = False
         return False
     
     # Check for result
     try:
-        result = face_result_queue.get_nowait()
-        face_recognition_pending = False
+        result = face_state.results.popleft()
+        face_state.pending = False
         
-        if result != "unknown":
+        if result != b"unknown":
             # Face recognized - open door
-            print(f"[FACE] Face recognized: {result}! Activating servo.")
+            log.info("[FACE] Face recognized: %s! Activating servo.", result.decode(errors="replace"))
             authorized_door_open = True
-            last_authorized_open_time = time.time()  # Record time for legal open
-            last_face_recognition_success = time.time()  # Record successful face recognition
+            authorized_until_ns = now_ns + AUTHORIZED_DOOR_OPEN_INTERVAL_NS  # Legal open window
+            face_recognition_cooldown_until_ns = now_ns + FACE_RECOGNITION_COOLDOWN_NS
             try:
                 send_status_async("AUTHORIZED_CARD")
             except Exception as e:
-                print(f"Failed to send AUTHORIZED_CARD status: {e}")
-            servo.set_angle(180)
-            time.sleep(2)
-            servo.set_angle(0)
+                log.error("Failed to send AUTHORIZED_CARD status: %s", e)
+            servo.open_then_close_after(open_angle=180, close_angle=0, hold_seconds=2.0)
             return True
         else:
-            print("[FACE] No face match detected (unknown).")
+            log.info("[FACE] No face match detected (unknown).")
             return False
             
-    except Empty:
+    except IndexError:
         # No result yet, keep waiting
         return False
 
+def print_status(now_ns, motion_snap, face_state):
+    """Print a one-line system status from the main loop's motion snapshot."""
+    motion_ns, count, pir_active = motion_snap
+    time_since_motion = (now_ns - motion_ns) / NS_PER_S if motion_ns else float('inf')
+    log.info("[STATUS] Motion count: %d, Last motion: %.1fs ago, PIR active: %s, Face pending: %s, Active images: %d",
+             count, time_since_motion, pir_active, face_state.pending, active_image_count)
+
 def main():
-    global authorized_door_open, last_motion_time, last_authorized_open_time, last_face_recognition_success
+    global last_motion_ns, motion_until_ns, door_state
 
     # 1) Instantiate hardware interfaces
     authorized_uids = ["0C00201B99", "0C00203733"]
-    reader = RFIDReader(serial_port="/dev/serial0", authorized_uids=authorized_uids)
     servo = ServoController(pin=gpio_pins.SERVO_PIN)
 
     # 2) Set up PIR sensor callback
     setup_pir_sensor(pi, PIR_PIN)
     pir_callback = pi.callback(PIR_PIN, pigpio.RISING_EDGE, pir_motion_callback)
 
-    # 3) Start RFID reader thread
-    rfid_thread = threading.Thread(
-        target=rfid_reader_thread,
-        args=(reader, rfid_queue, shutdown_event),
-        daemon=True
-    )
-    rfid_thread.start()
-
-    # 4) Start alarm monitor thread
-    alarm_thread = threading.Thread(
-        target=alarm_monitor_thread,
-        args=(shutdown_event,),
-        daemon=True
-    )
-    alarm_thread.start()
-
-    # 5) Start PIR watchdog thread
-    pir_watchdog = threading.Thread(
-        target=pir_watchdog_thread,
-        args=(shutdown_event,),
-        daemon=True
-    )
-    pir_watchdog.start()
-
-    # 6) Start listening for face recognition results
-    face_result_mqtt_client = start_face_result_listener(broker_ip="192.168.166.195")
-
-    print("System initialized. Waiting for activity...")
+    # Set up magnetic door sensor edge callback, seeded with the current state
+    door_state = magnetic_sensor.read()
+    door_callback = magnetic_sensor.watch_edges(door_edge_callback)
+
+    # 3) Start RFID reader process; restarted with backoff whenever it exits
+    rfid_proc, rfid_read_fd = start_rfid_reader(authorized_uids)
+    rfid_started_ns = time.monotonic_ns()
+    rfid_restart_ns = None  # restart deadline while the reader is down
+    rfid_restart_backoff_ns = RFID_RESTART_MIN_NS
+
+    # 4) Start listening for face recognition results
+    face_state = FaceState()
+    face_result_mqtt_client = start_face_result_listener(mqtt_client, face_state, broker_ip="192.168.166.195")
+
+    # 5) Register event sources with the main loop selector
+    selector = selectors.DefaultSelector()
+    selector.register(_wake_r, selectors.EVENT_READ, "wake")
+    selector.register(rfid_read_fd, selectors.EVENT_READ, "rfid")
+    watch_mqtt_socket(selector, face_result_mqtt_client)
+
+    # 6) Schedule alarm monitor, PIR watchdog and MQTT keepalive on the main loop
+    scheduler = PeriodicTasks()
+    start_ns = time.monotonic_ns()
+    scheduler.add(DOOR_CHECK_INTERVAL_NS, check_door_state, start_ns)
+    scheduler.add(PIR_WATCHDOG_INTERVAL_NS, check_pir_health, start_ns)
+    scheduler.add(MQTT_MISC_INTERVAL_NS,
+                  lambda now_ns: mqtt_housekeeping(selector, face_result_mqtt_client, now_ns), start_ns)
+
+    log.info("System initialized. Waiting for activity...")
     
     # Track when we last attempted image capture to avoid spam
-    last_image_attempt = 0
-    IMAGE_COOLDOWN = 3  # seconds between image attempts
+    image_cooldown_until_ns = 0
+
+    next_status_ns = start_ns + STATUS_INTERVAL_NS
 
     try:
         while True:
-            current_time = time.time()
-            
+            # --- Sleep until an event arrives or the nearest deadline is due ---
+            now_ns = time.monotonic_ns()
+            deadlines = [next_status_ns, scheduler.next_due()]
+            if rfid_restart_ns is not None:
+                deadlines.append(rfid_restart_ns)
+            if rfid_state == RFID_WAITING_CARD_REMOVAL:
+                deadlines.append(card_removal_deadline_ns)
+            if face_state.pending:
+                deadlines.append(face_state.timeout_ns)
+            else:
+                # Only this thread writes motion_until_ns, so no lock is needed to read it
+                if now_ns < motion_until_ns:
+                    # Keep re-checking distance while motion is recent, but not before cooldowns expire
+                    deadlines.append(max(image_cooldown_until_ns,
+                                         face_recognition_cooldown_until_ns,
+                                         now_ns + MOTION_RECHECK_INTERVAL_NS))
+            timeout = max(0, min(deadlines) - now_ns) / NS_PER_S
+
+            for key, mask in selector.select(timeout):
+                if key.data == "wake":
+                    try:
+                        _wake_r.recv(64)
+                    except BlockingIOError:
+                        pass
+                elif key.data == "mqtt" and mask & selectors.EVENT_READ:
+                    read_mqtt(selector, face_result_mqtt_client)
+                elif key.data == "rfid":
+                    if not read_rfid_pipe(rfid_read_fd):
+                        # Reader exited (e.g. serial port open failed): reap it and restart later
+                        selector.unregister(rfid_read_fd)
+                        os.close(rfid_read_fd)
+                        rfid_read_fd = None
+                        _rfid_buf.clear()
+                        try:
+                            rc = rfid_proc.wait(timeout=1.0)
+                        except subprocess.TimeoutExpired:
+                            rfid_proc.kill()
+                            rc = rfid_proc.wait()
+                        exit_ns = time.monotonic_ns()
+                        if exit_ns - rfid_started_ns >= RFID_RESTART_MAX_NS:
+                            rfid_restart_backoff_ns = RFID_RESTART_MIN_NS  # Ran fine for a while
+                        log.error("[RFID] Reader process exited (code %s), restarting in %.0fs",
+                                  rc, rfid_restart_backoff_ns / NS_PER_S)
+                        rfid_restart_ns = exit_ns + rfid_restart_backoff_ns
+                        rfid_restart_backoff_ns = min(rfid_restart_backoff_ns * 2, RFID_RESTART_MAX_NS)
+            flush_mqtt(selector, face_result_mqtt_client)
+
+            with pending_lock:
+                events = pending_events.copy()
+                pending_events.clear()
+
+            now_ns = time.monotonic_ns()
+
             # --- Process RFID events (HIGHEST PRIORITY - always check first) ---
-            process_rfid_events(reader, servo)
-            
+            while process_rfid_events(servo, now_ns):
+                pass
+
+            # --- Snapshot motion state with a single lock acquire; PIR edges are stamped here ---
+            with motion_lock:
+                if "motion" in events:
+                    last_motion_ns = now_ns
+                    motion_until_ns = now_ns + MOTION_WINDOW_NS
+                motion_snap = (last_motion_ns, motion_count, pir_callback_active)
+
+            if rfid_restart_ns is not None and now_ns >= rfid_restart_ns:
+                rfid_proc, rfid_read_fd = start_rfid_reader(authorized_uids)
+                rfid_started_ns = now_ns
+                rfid_restart_ns = None
+                selector.register(rfid_read_fd, selectors.EVENT_READ, "rfid")
+
+            # --- React to door edges immediately ---
+            if "door" in events:
+                check_door_state(now_ns)
+
+            if "mqtt_reconnect" in events:
+                on_mqtt_reconnect_done(selector, face_result_mqtt_client, now_ns)
+                flush_mqtt(selector, face_result_mqtt_client)
+
+            if "image" in events:
+                publish_queued_images(selector, face_result_mqtt_client)
+
+            # --- Run due periodic tasks (door alarm, PIR watchdog, MQTT keepalive) ---
+            scheduler.run_due(now_ns)
+
             # --- Check face recognition result (non-blocking) ---
-            check_face_recognition_result(servo)
+            if face_state.pending:
+                check_face_recognition_result(servo, face_state, now_ns)
 
             # --- PIR + Ultrasonic "Send Image" logic ---
             # Only start new face recognition if not already pending
-            if (not face_recognition_pending and 
-                (current_time - last_image_attempt) > IMAGE_COOLDOWN and 
-                (current_time - last_face_recognition_success) > FACE_RECOGNITION_COOLDOWN):
+            if (not face_state.pending and 
+                now_ns >= image_cooldown_until_ns and 
+                now_ns >= face_recognition_cooldown_until_ns):
                 
-                if check_motion_and_distance():
-                    last_image_attempt = current_time
-                    start_face_recognition()
+                if check_motion_and_distance(now_ns, motion_until_ns):
+                    image_cooldown_until_ns = now_ns + IMAGE_COOLDOWN_NS
+                    start_face_recognition(face_state, now_ns)
 
-            # --- Periodic status output (every 30 seconds) ---
-            if int(current_time) % 30 == 0:
-                with motion_lock:
-                    time_since_motion = current_time - last_motion_time if last_motion_time > 0 else float('inf')
-                print(f"[STATUS] Motion count: {motion_count}, Last motion: {time_since_motion:.1f}s ago, Face pending: {face_recognition_pending}, Active images: {len(active_image_futures)}")
-                time.sleep(1)  # Avoid multiple prints in the same second
-
-            # --- Very short sleep to keep loop responsive ---
-            time.sleep(0.05)  # Reduced from 0.1 to 0.05 for better responsiveness
+            # --- Periodic status output (every STATUS_INTERVAL_NS) ---
+            if now_ns >= next_status_ns:
+                print_status(now_ns, motion_snap, face_state)
+                next_status_ns = now_ns + STATUS_INTERVAL_NS
 
     except KeyboardInterrupt:
-        print("\nShutting down gracefully...")
+        log.info("Shutting down gracefully...")
 
     finally:
-        # Signal threads to stop
-        shutdown_event.set()
-        
-        # Wait for threads to finish
-        for thread in [rfid_thread, alarm_thread, pir_watchdog]:
-            thread.join(timeout=1.0)
+        # Stop the RFID reader process
+        rfid_proc.terminate()
+        try:
+            rfid_proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            rfid_proc.kill()
+        if rfid_read_fd is not None:
+            os.close(rfid_read_fd)
 
         # Cleanup hardware
         try:
-            reader.cleanup()
             servo.cleanup()
             ultrasonic_sensor.cleanup()
             pir_callback.cancel()
+            door_callback.cancel()
             pi.stop()
         except Exception as e:
-            print(f"Error during cleanup: {e}")
+            log.error("Error during cleanup: %s", e)
 
         # Cleanup MQTT face result listener
         try:
-            face_result_mqtt_client.loop_stop()
             face_result_mqtt_client.disconnect()
         except Exception as e:
-            print(f"Error disconnecting MQTT: {e}")
+            log.error("Error disconnecting MQTT: %s", e)
 
         # Cleanup thread pool
         try:
-            print("Shutting down image thread pool...")
+            log.info("Shutting down image thread pool...")
             image_executor.shutdown(wait=True, timeout=5.0)
         except Exception as e:
-            print(f"Error shutting down thread pool: {e}")
+            log.error("Error shutting down thread pool: %s", e)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,6 +6,7 @@ ESP32_IP   = "192.168.166.100"
 ESP32_PORT = 5000
 
 VALID_CODES = ("AUTHORIZED_CARD", "UNAUTHORIZED_CARD", "PHYSICAL_ALARM")
+_STATUS_PAYLOADS = {code: (code + "\n").encode("utf-8") for code in VALID_CODES}  # Pre-encoded wire messages
 
 def send_status(status: str, timeout: float = 2.0) -> bool:
     """
@@ -18,8 +19,7 @@ def send_status(status: str, timeout: float = 2.0) -> bool:
 
     try:
         with socket.create_connection((ESP32_IP, ESP32_PORT), timeout=timeout) as sock:
-            message = code + "\n"
-            sock.sendall(message.encode("utf-8"))
+            sock.sendall(_STATUS_PAYLOADS[code])
         return True
     except Exception as e:
         print(f"[pi_sender] Failed to send '{code}': {e}")
@@ -28,8 +28,13 @@ def send_status(status: str, timeout: float = 2.0) -> bool:
 def send_status_async(status: str, timeout: float = 2.0):
     """
     Sends status to ESP32 asynchronously to avoid blocking main thread.
+    The ESP32 reads one line per connection, so each status gets its own connection and thread.
     """
-    threading.Thread(target=send_status, args=(status, timeout), daemon=True).start()
+    code = status.strip().upper()
+    if code not in VALID_CODES:
+        raise ValueError(f"send_status_async: status must be one of {VALID_CODES}")
+
+    threading.Thread(target=send_status, args=(code, timeout), daemon=True).start()
 
 if __name__ == "__main__":
     # Quick sanity‐check:
@@ -38,6 +38,20 @@ class MagneticSensor:
             print(f"Error reading magnetic sensor: {e}")
             return None
 
+    def watch_edges(self, callback, glitch_filter_us=10000):
+        """
+        Registers a pigpio callback for door open/close edges instead of polling read().
+        Args:
+            callback (callable): Called by pigpio as callback(gpio, level, tick).
+            glitch_filter_us (int): Reed switch bounces shorter than this are dropped
+                by the pigpio daemon (0 disables the filter).
+        Returns:
+            pigpio._callback: Handle; call cancel() on it to stop watching.
+        """
+        if glitch_filter_us:
+            self.pi.set_glitch_filter(self.pin, glitch_filter_us)
+        return self.pi.callback(self.pin, pigpio.EITHER_EDGE, callback)
+
     def calibrate(self, sample_time=5):
         """
         Calibrates the magnetic sensor by reading the sensor state over a period of time.
@@ -6,15 +6,19 @@ from utils import gpio_pins
 
 PIR_PIN = gpio_pins.PIR_SENSOR_PIN
 
-def setup_pir_sensor(pi, pin=PIR_PIN):
+def setup_pir_sensor(pi, pin=PIR_PIN, glitch_filter_us=50000):
     """
     Sets up the GPIO pin for the PIR sensor.
     Args:
         pi (pigpio.pi): pigpio instance.
         pin (int): GPIO pin number to which the PIR sensor is connected.
+        glitch_filter_us (int): Level changes shorter than this are dropped by the
+            pigpio daemon before any callback fires (0 disables the filter).
     """
     try:
         pi.set_mode(pin, pigpio.INPUT)
+        if glitch_filter_us:
+            pi.set_glitch_filter(pin, glitch_filter_us)
         print(f"PIR sensor setup on GPIO pin {pin}")
     except Exception as e:
         print(f"Error setting up PIR sensor: {e}")
@@ -1,6 +1,9 @@
+import os
 import serial
+import signal
+import sys
 import time
-from utils.logger import get_logger
+from utils.logger import get_logger, stop_logging
 
 logger = get_logger(__name__)
 
@@ -12,6 +15,7 @@ class RFIDReader:
         serial_port (str): Serial port device path.
         baudrate (int): Baud rate for serial communication.
         authorized_uids (list): List of authorized card UIDs as strings.
+        timed_out (bool): The last read_card() call returned because the serial read timed out.
     """
 
     def __init__(self, serial_port: str = "/dev/serial0", baudrate: int = 9600, authorized_uids: list = None):
@@ -29,6 +33,7 @@ class RFIDReader:
         self.last_uid = None  # Last read UID
         self.last_read_time = 0  # Last read timestamp
         self.debounce_interval = 2.0  # Debounce interval in seconds
+        self.timed_out = False  # Set by read_card(); distinguishes no card from a debounced frame
 
         try:
             self.ser = serial.Serial(self.serial_port, self.baudrate, timeout=1)
@@ -45,7 +50,9 @@ class RFIDReader:
             tuple (bool, str): 
                 - bool: True if UID is authorized, False otherwise.
                 - str: UID string from the card, or None if read fails or debounced.
+                  `timed_out` tells a timeout (no card in range) apart from the other cases.
         """
+        self.timed_out = False
         try:
             # Read byte by byte until start byte (0x02) is found
             while True:
@@ -74,6 +81,7 @@ class RFIDReader:
                         return False, None
                 elif not byte:
                     # Return None on timeout
+                    self.timed_out = True
                     return False, None
 
         except Exception as e:
@@ -90,4 +98,51 @@ class RFIDReader:
                 logger.info(f"Serial port {self.serial_port} closed")
         except Exception as e:
             logger.error(f"Failed to cleanup serial port: {e}")
-            raise
\ No newline at end of file
+            raise
+
+def rfid_worker(out_fd: int, serial_port: str = "/dev/serial0", authorized_uids: list = None):
+    """
+    Reader-process entry point: own the serial port and forward card reads over a pipe.
+
+    Messages written to `out_fd`, one per line (each well under PIPE_BUF, so writes are atomic):
+        - b'A' + uid: authorized card read.
+        - b'U' + uid: unauthorized card read.
+        - b'-': first serial timeout after a card, i.e. the card was removed.
+          A card held on the reader keeps sending debounced frames, so no timeout occurs.
+
+    Args:
+        out_fd (int): Write end of the pipe to the parent.
+        serial_port (str): Path to serial port device.
+        authorized_uids (list): List of authorized UID strings.
+    """
+    parent_pid = os.getppid()
+    reader = RFIDReader(serial_port=serial_port, authorized_uids=authorized_uids)
+    card_present = False
+    try:
+        while True:
+            authorized, uid = reader.read_card()  # Returns at least once per serial timeout
+            if os.getppid() != parent_pid:
+                # main.py died without stopping us; release the serial port for its restart
+                logger.warning("Parent process exited, stopping RFID reader")
+                break
+            if uid:
+                os.write(out_fd, (b'A' if authorized else b'U') + uid.encode('ascii') + b'\n')
+                card_present = True
+            elif card_present and reader.timed_out:
+                os.write(out_fd, b'-\n')
+                card_present = False
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        try:
+            reader.cleanup()
+            os.close(out_fd)
+        finally:
+            stop_logging()  # Flush this process's records; do not rely on atexit
+
+
+if __name__ == "__main__":
+    # Started by main.py as: python -m sensors.rfid_reader <out_fd> <serial_port> [authorized_uid ...]
+    # A fresh interpreter, so none of main.py's hardware setup or threads are inherited.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Run the cleanup in rfid_worker
+    rfid_worker(int(sys.argv[1]), sys.argv[2], sys.argv[3:])
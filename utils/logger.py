@@ -1,6 +1,47 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 
+# Records are handed to a background QueueListener. QueueHandler.prepare() still formats
+# the message on the calling thread; only the stdout write happens on the listener thread.
+# Set LOG_LEVEL (e.g. WARNING) to disable lower levels at the logger, before any record is built.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    print(f"Invalid LOG_LEVEL {LOG_LEVEL!r}, using INFO", file=sys.stderr)
+    LOG_LEVEL = "INFO"
+
+_log_queue = queue.SimpleQueue()
+_listener = None
+
+
+def _start_listener():
+    global _listener
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_formatter = logging.Formatter(
+        "%(asctime)s [%(levelname)-5s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    console_handler.setFormatter(console_formatter)
+    _listener = logging.handlers.QueueListener(_log_queue, console_handler)
+    _listener.start()
+    atexit.register(stop_logging)  # Flush queued records on exit
+
+
+def stop_logging():
+    """
+    Write out queued records and stop the listener thread. Safe to call more than once.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(name: str = __name__) -> logging.Logger:
     """
     Returns a configured logger instance.
@@ -14,16 +55,12 @@ def get_logger(name: str = __name__) -> logging.Logger:
     if logger.hasHandlers():
         return logger
 
-    logger.setLevel(logging.DEBUG)
+    if _listener is None:
+        _start_listener()
 
-    # Console handler: outputs INFO level and above to stdout
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_formatter = logging.Formatter(
-        "%(asctime)s [%(levelname)-5s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    logger.setLevel(LOG_LEVEL)
+
+    # Queue handler: outputs LOG_LEVEL and above to stdout via the listener thread
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 
     return logger
\ No newline at end of file
@@ -0,0 +1,50 @@
+# utils/scheduler.py
+import heapq
+import itertools
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PeriodicTasks:
+    """
+    Min-heap of periodic callables, driven by the caller's own loop.
+
+    Attributes:
+        _heap (list): Entries of (next_fire_time, seq, interval, callable).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()  # Tie-breaker so callables are never compared
+
+    def add(self, interval: float, func, now: float):
+        """
+        Register `func` to run every `interval`, first at now + interval.
+
+        :param interval: Period, in the same unit as `now`.
+        :param func: Callable taking the current time as its only argument.
+        :param now: Current time, in the same clock the caller passes to run_due().
+        """
+        heapq.heappush(self._heap, (now + interval, next(self._seq), interval, func))
+
+    def next_due(self) -> float:
+        """
+        Returns the fire time of the earliest task, or infinity if none are registered.
+        """
+        return self._heap[0][0] if self._heap else float('inf')
+
+    def run_due(self, now: float):
+        """
+        Run every task whose fire time has passed, passing it `now`, and reschedule it.
+        A task that raises is logged and stays scheduled; the exception does not reach the caller.
+
+        :param now: Current time.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, interval, func = heapq.heappop(self._heap)
+            try:
+                func(now)
+            except Exception as e:
+                logger.error(f"Periodic task {getattr(func, '__name__', func)!r} failed: {e}")
+            heapq.heappush(self._heap, (now + interval, seq, interval, func))
@@ -0,0 +1,69 @@
+# utils/worker_pool.py
+import threading
+from concurrent.futures import Future
+from queue import SimpleQueue
+
+
+class PrewarmedPool:
+    """
+    Minimal executor whose worker threads are started up front.
+
+    Unlike ThreadPoolExecutor, which spawns threads lazily on submit(), the workers
+    are already blocked on the task queue, so submit() is a single queue put.
+
+    Attributes:
+        max_workers (int): Number of worker threads.
+        thread_name_prefix (str): Prefix for worker thread names.
+    """
+
+    def __init__(self, max_workers: int = 1, thread_name_prefix: str = "PoolWorker"):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._tasks = SimpleQueue()
+        self._shutdown = False
+        self._threads = []
+        for i in range(max_workers):
+            thread = threading.Thread(target=self._worker, name=f"{thread_name_prefix}_{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Queue `fn(*args, **kwargs)` for a worker.
+
+        :return: concurrent.futures.Future for the call.
+        """
+        if self._shutdown:
+            raise RuntimeError("cannot submit after shutdown")
+        future = Future()
+        self._tasks.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True, timeout: float = None):
+        """
+        Stop the workers once already-queued tasks have run.
+
+        :param wait: Join the worker threads before returning.
+        :param timeout: Maximum seconds to wait for each worker when joining.
+        """
+        self._shutdown = True
+        for _ in self._threads:
+            self._tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout=timeout)